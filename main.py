@@ -1,12 +1,21 @@
 import asyncio
 from utils.core import process
 
+# Use uvloop when available (not supported on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 async def main():
     await process()
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        if uvloop:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         pass
@@ -1,9 +1,10 @@
 import asyncio
+import random
 import time
 
 from utils.network import get_profile_info, ping_all_accounts
 from utils.services import get_proxy_choice, assign_proxies
-from utils.services import processed_tokens, load_tokens, send_request
+from utils.services import processed_tokens, load_tokens, retry_request_many, aclose_all, IMPERSONATE_LIST
 from utils.settings import ACTIVATE_ACCOUNTS, DAILY_CLAIM, logger, Fore
 from utils.settings import DOMAIN_API, CONNECTION_STATES, setup_logging, startup_art
 
@@ -17,6 +18,9 @@ class AccountData:
         self.index = index
         self.proxy = proxy
 
+        # Keep one impersonate per account so its fingerprint and pooled session stay stable
+        self.impersonate = random.choice(IMPERSONATE_LIST)
+
         # Set the initial connection status to 'None' (no connection)
         self.status_connect = CONNECTION_STATES["NONE_CONNECTION"]
         self.points_per_proxy = {}
@@ -48,8 +52,7 @@ async def activate_accounts(accounts) -> None:
     if isinstance(accounts, AccountData):
         accounts = [accounts]
 
-    tasks = [send_request(DOMAIN_API["ACTIVATE"], {}, account, method="POST") for account in accounts]
-    responses = await asyncio.gather(*tasks, return_exceptions=True)
+    responses = await retry_request_many([(DOMAIN_API["ACTIVATE"], {}, account) for account in accounts])
 
     for account, response in zip(accounts, responses):
         if isinstance(response, Exception):
@@ -89,6 +92,8 @@ async def clean_up_resources():
     except asyncio.CancelledError:
         pass
 
+    await aclose_all()
+
     logger.info(f"{Fore.CYAN}00{Fore.RESET} - {Fore.GREEN}Cleanup completed{Fore.RESET}")
 
 # Main function to manage the application flow
@@ -1,3 +1,3 @@
-from .api_client import send_request, retry_request
+from .api_client import send_request, retry_request, retry_request_many, aclose_all, IMPERSONATE_LIST
 from .token_manager import processed_tokens, mark_token, mask_token, load_tokens
 from .proxy_manager import get_proxy_choice, assign_proxies, resolve_ip
\ No newline at end of file
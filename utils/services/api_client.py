@@ -1,16 +1,143 @@
 import asyncio
-import json
+import math
+import orjson
 import random
-import requests
+import re
+import statistics
 import time
 
-from curl_cffi import requests
+from collections import deque
+from curl_cffi.const import CurlECode, CurlHttpVersion
+from curl_cffi.curl import CurlError
+from curl_cffi.requests import AsyncSession
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from types import MappingProxyType
 from urllib.parse import urlparse
-from utils.settings import DOMAIN_API, REQUEST_TIMEOUT, logger, Fore
+from utils.settings import DOMAIN_API, MAX_CONCURRENT_REQUESTS, RATE_LIMIT_RPM, REQUEST_TIMEOUT, logger, Fore
 
 
+# curl error codes reported when the proxy itself fails
+PROXY_ERROR_CODES = frozenset({CurlECode.PROXY, CurlECode.COULDNT_RESOLVE_PROXY})
+
+# Browser fingerprints to impersonate; each account keeps one for its lifetime
+IMPERSONATE_LIST = ("safari15_3", "safari15_5")
+
+# Endpoints that expect the full browser-like header set
+FULL_HEADER_ENDPOINTS = frozenset({
+    *DOMAIN_API["PING"],
+    DOMAIN_API["ACTIVATE"],
+    DOMAIN_API["EARN_INFO"],
+    DOMAIN_API["MISSION"],
+    DOMAIN_API["COMPLETE_MISSION"],
+})
+
+# Necessary headers
+NECESSARY_HEADERS = MappingProxyType({
+    "Accept": "*/*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://app.nodepay.ai/",
+    "Origin": "chrome-extension://lgmpfmgeabnnlemejacfljbmonaomfmm",
+    "Connection": "keep-alive",
+})
+
+# Optional headers
+OPTIONAL_HEADERS = MappingProxyType({
+    "Sec-CH-UA": '"Not(A:Brand";v="99", "Brave";v="133", "Chromium";v="133"',
+    "Sec-Ch-Ua-Mobile": "?0",
+    "Sec-Ch-Ua-Platform": '"Windows"',
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-Storage-Access": "active",
+    "Cache-Control": "no-cache",
+})
+
+# Endpoint header sets, merged once at import
+FULL_HEADERS = MappingProxyType({**NECESSARY_HEADERS, **OPTIONAL_HEADERS})
+MINIMAL_HEADERS = MappingProxyType({"Accept": "application/json"})
+
+# Sessions are kept alive and reused per (proxy, impersonate) pair
+_SESSIONS = {}
+
+# Adaptive concurrency limiters per (proxy, host)
+_BACKPRESSURE = {}
+
+# Sliding one-minute window of request timestamps and request limits per (proxy, host)
+_RPM = {}
+_RPM_LIMITS = {}
+
+# Last advertised (remaining, reset_at) per (token, proxy, host), since quotas may be per token
+_RATE_STATE = {}
+
+# Rate limit header families understood by the client
+RATELIMIT_LIMIT_HEADERS = ("x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+RATELIMIT_REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+RATELIMIT_RESET_HEADERS = ("x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset")
+
+# Longest wait accepted from a rate limit header, in seconds
+MAX_RATE_LIMIT_DELAY = 60
+
+# Duration form used by x-ratelimit-reset-* headers, e.g. "1s", "6m0s", "250ms"
+DURATION_PATTERN = re.compile(r"(?:\d+(?:\.\d+)?(?:ms|h|m|s))+")
+DURATION_PART_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+# Concurrency limit that adapts to the host (additive increase, multiplicative decrease)
+class _Backpressure:
+    def __init__(self, c_max, c_min=1, alpha=0.5, beta=0.5):
+        self.c = float(c_max)
+        self.c_min = c_min
+        self.c_max = c_max
+        self.alpha = alpha
+        self.beta = beta
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.latencies = deque(maxlen=32)
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.c))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    # Latency above twice the recent median counts as the host slowing down
+    def latency_target(self):
+        if len(self.latencies) < 8:
+            return None
+        return 2 * statistics.median(self.latencies)
+
+    def record(self, status_code, start_time):
+        if status_code == 429 or status_code >= 500:
+            self.decrease(start_time)
+            return
+
+        latency = time.monotonic() - start_time
+        target = self.latency_target()
+        self.latencies.append(latency)
+        if target is None or latency <= target:
+            self.c = min(self.c_max, self.c + self.alpha)
+
+    # Requests sent before the last decrease belong to the same congestion event,
+    # so at most one decrease happens per window of in-flight requests
+    def decrease(self, start_time):
+        if start_time < self.last_decrease:
+            return
+
+        self.last_decrease = time.monotonic()
+        self.c = max(self.c_min, self.c * self.beta)
+
 # Function to build HTTP headers dynamically with hardcoded User-Agent
-async def build_headers(url, account, method="POST", data=None):
+# internal: assumes validated inputs
+async def build_headers(url, account):
     """
     Build headers for API requests dynamically with fixed User-Agent.
     """
@@ -22,131 +149,275 @@ async def build_headers(url, account, method="POST", data=None):
     }
 
     # Add endpoint-specific headers
-    endpoint_specific_headers = get_endpoint_headers(url)
-    headers.update(endpoint_specific_headers)
-
-    # Validate serializability of data
-    if method in ["POST", "PUT"] and data is not None:
-        if not isinstance(data, dict):
-            raise ValueError("Payload must be a dictionary.")
-        try:
-            json.dumps(data, ensure_ascii=False)
-        except (TypeError, ValueError) as e:
-            raise ValueError(f"Invalid payload data: {e}")
+    headers.update(get_endpoint_headers(url))
 
     return headers
 
 # Function to return endpoint-specific headers based on the API
 def get_endpoint_headers(url):
     """
-    Return endpoint-specific headers based on the API.
+    Return endpoint-specific headers based on the API. The result is shared and read-only.
     """
-    EARN_MISSION_SET = {DOMAIN_API["EARN_INFO"], DOMAIN_API["MISSION"], DOMAIN_API["COMPLETE_MISSION"]}
-    PING_LIST = DOMAIN_API["PING"]
-    ACTIVATE_URL = DOMAIN_API["ACTIVATE"]
+    return FULL_HEADERS if url in FULL_HEADER_ENDPOINTS else MINIMAL_HEADERS
 
-    # Necessary headers
-    necessary_headers = {
-        "Accept": "*/*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://app.nodepay.ai/",
-        "Origin": "chrome-extension://lgmpfmgeabnnlemejacfljbmonaomfmm",
-        "Connection": "keep-alive",
-    }
+# Cached URL accessors; the set of API URLs is small and fixed
+@lru_cache(maxsize=128)
+def _url_path(url):
+    return urlparse(url).path
 
-    # Optional headers
-    optional_headers = {
-        "Sec-CH-UA": '"Not(A:Brand";v="99", "Brave";v="133", "Chromium";v="133"',
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": '"Windows"',
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-Storage-Access": "active",
-        "Cache-Control": "no-cache",
-    }
+@lru_cache(maxsize=128)
+def _url_host(url):
+    return urlparse(url).netloc
 
-    # Check if the URL matches specific sets
-    if url in PING_LIST or url in EARN_MISSION_SET or url == ACTIVATE_URL:
-        return {**necessary_headers, **optional_headers}
+# Check whether a curl error was caused by a timeout
+def _is_timeout(exc):
+    return getattr(exc, "code", None) == CurlECode.OPERATION_TIMEDOUT
 
-    # Default minimal headers
-    return {"Accept": "application/json"}
+# Check whether a curl error was caused by the proxy, including a refused CONNECT tunnel (407/403)
+def _is_proxy_error(exc):
+    code = getattr(exc, "code", None)
+    return code in PROXY_ERROR_CODES or (code == CurlECode.RECV_ERROR and "CONNECT" in str(exc))
 
-# Randomly selects an impersonate value
-def get_dynamic_impersonate():
+# Return the pooled session for the given proxy and impersonate, creating it on first use
+def get_session(proxy, impersonate):
     """
-    Generate a dynamic impersonate value that changes every minute.
+    Reuse one session per (proxy, impersonate) so connections stay open between requests.
     """
-    impersonate_list = ["safari15_3", "safari15_5"]
-    return random.choice(impersonate_list)
+    key = (proxy, impersonate)
+    session = _SESSIONS.get(key)
+    if session is None:
+        session = _SESSIONS[key] = _make_session(proxy, impersonate)
+    return session
 
-# Function to send HTTP requests with error handling and custom headers
-async def send_request(url, data, account, method="POST", timeout=REQUEST_TIMEOUT):
+# Create a new HTTP session for the given proxy and impersonate
+def _make_session(proxy, impersonate):
+    proxies = {"http": proxy, "https": proxy} if proxy else None
+    return AsyncSession(impersonate=impersonate, proxies=proxies, http_version=CurlHttpVersion.V2TLS)
+
+# Return the concurrency limiter for a (proxy, host) key
+def get_backpressure(host_key):
     """
-    Perform HTTP requests with proper headers and error handling.
+    Keep one limiter per proxy and host so a failing proxy only slows itself down.
+    """
+    backpressure = _BACKPRESSURE.get(host_key)
+    if backpressure is None:
+        backpressure = _BACKPRESSURE[host_key] = _Backpressure(MAX_CONCURRENT_REQUESTS)
+    return backpressure
+
+# Wait until the proxy's one-minute window for the host has room for another request
+async def wait_for_rate_window(host_key):
+    """
+    Hold the request back instead of sending one that would be rate limited.
+    """
+    window = _RPM.setdefault(host_key, deque())
+
+    while True:
+        limit = _RPM_LIMITS.get(host_key, RATE_LIMIT_RPM)
+        now = time.monotonic()
+
+        while window and window[0] <= now - 60:
+            window.popleft()
+
+        if limit <= 0 or len(window) < limit:
+            window.append(now)
+            return
+
+        await asyncio.sleep(window[0] + 60 - now)
+
+# Convert a "6m0s"-style duration into seconds
+def _parse_duration(value):
+    if not DURATION_PATTERN.fullmatch(value):
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_PART_PATTERN.findall(value))
+
+# Convert a delay header (seconds, duration, HTTP-date or ISO timestamp) into seconds from now
+def _parse_delay(value):
+    """
+    Return the delay in seconds, capped at MAX_RATE_LIMIT_DELAY, or None if it cannot be parsed.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    delay = _parse_raw_delay(value)
+    if delay is None or not math.isfinite(delay):
+        return None
+    return min(MAX_RATE_LIMIT_DELAY, max(0.0, delay))
+
+# Parse a delay header without bounds checking
+def _parse_raw_delay(value):
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    duration = _parse_duration(value)
+    if duration is not None:
+        return duration
+
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp() - time.time()
+
+# Return the first integer value found among the given headers
+def _header_int(headers, names):
+    for name in names:
+        value = headers.get(name)
+        if value and value.isdigit():
+            return int(value)
+    return None
+
+# Extract rate limit information from response headers
+def _parse_ratelimit(headers):
+    """
+    Return (remaining, reset_at, retry_after), with reset_at on the monotonic clock.
+    """
+    remaining = _header_int(headers, RATELIMIT_REMAINING_HEADERS)
+
+    reset_at = None
+    for name in RATELIMIT_RESET_HEADERS:
+        delay = _parse_delay(headers.get(name))
+        if delay is not None:
+            reset_at = time.monotonic() + delay
+            break
+
+    retry_after = _parse_delay(headers.get("Retry-After"))
+    return remaining, reset_at, retry_after
+
+# Remember the limits advertised by the host for the client that received them
+def update_rate_limit(host_key, quota_key, headers):
+    """
+    Store the advertised limits and return the Retry-After delay, if any.
+    """
+    limit = _header_int(headers, RATELIMIT_LIMIT_HEADERS)
+    if limit:
+        _RPM_LIMITS[host_key] = limit
+
+    remaining, reset_at, retry_after = _parse_ratelimit(headers)
+    _RATE_STATE[quota_key] = (remaining, reset_at)
+    return retry_after
+
+# Pause when the account's remaining quota for the host is almost used up
+async def wait_for_rate_reset(host_key, quota_key):
+    remaining, reset_at = _RATE_STATE.get(quota_key, (None, None))
+    if remaining is None or reset_at is None:
+        return
+
+    limit = _RPM_LIMITS.get(host_key, RATE_LIMIT_RPM)
+    if remaining <= max(2, limit * 0.1):
+        delay = reset_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# Close every pooled session, used during shutdown
+async def aclose_all():
+    """
+    Close all pooled sessions and clear the pool.
     """
+    sessions = list(_SESSIONS.values())
+    _SESSIONS.clear()
+
+    for session in sessions:
+        try:
+            await session.close()
+        except Exception:
+            pass
+
+# Validate request arguments once at the public entry point
+def _validate(url, data, method):
     if not url or not isinstance(url, str):
         raise ValueError("URL must be a valid string.")
     if data and not isinstance(data, dict):
         raise ValueError("Data must be a dictionary.")
+    if not isinstance(method, str):
+        raise ValueError("Method must be a string.")
 
-    headers = await build_headers(url, account, method, data)
+# Function to send HTTP requests with error handling and custom headers
+# internal: assumes validated inputs
+async def send_request(url, data, account, method="POST", timeout=REQUEST_TIMEOUT):
+    """
+    Perform HTTP requests with proper headers and error handling.
+    """
+    headers = await build_headers(url, account)
     if not headers:
-        logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}No headers generated for URL: {urlparse(url).path}{Fore.RESET}")
+        logger.error("{}{:02d}{} - {}No headers generated for URL: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, _url_path(url), Fore.RESET)
         raise ValueError("Failed to generate headers")
 
-    proxies = {}
-    if account.proxy:
-        proxies = {"http": account.proxy, "https": account.proxy}
-
-    impersonate_value = get_dynamic_impersonate()  # Select a valid impersonate
     response = None
+    retry_after = None
+
+    # Serialize the payload once; headers already declare application/json
+    # OPT_NON_STR_KEYS accepts int/float keys like the stdlib json encoder did
+    body = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) if method != "GET" and data is not None else None
 
     try:
-        session = requests.Session()
-        if proxies:  # Only update proxy if available
-            session.proxies.update(proxies)
-        session.headers.update(headers)
+        session_key = (account.proxy, account.impersonate)
+        session = get_session(*session_key)
 
-        if method == "GET":
-            response = session.get(url, headers=headers, proxies=proxies, impersonate=impersonate_value, timeout=timeout)
-        else:
-            response = session.post(url, json=data, headers=headers, proxies=proxies, impersonate=impersonate_value, timeout=timeout)
+        # Limits are tracked per proxy and host (the client as the server sees it), quotas per account
+        host = _url_host(url)
+        host_key = (account.proxy, host)
+        quota_key = (account.token, account.proxy, host)
+        await wait_for_rate_reset(host_key, quota_key)
+        await wait_for_rate_window(host_key)
+
+        async with get_backpressure(host_key) as backpressure:
+            start_time = time.monotonic()
+            try:
+                response = await session.request(method, url, data=body, headers=headers, timeout=timeout)
+            except CurlError as e:
+                if _is_timeout(e):
+                    backpressure.decrease(start_time)
+                raise
+            backpressure.record(response.status_code, start_time)
+
+        retry_after = update_rate_limit(host_key, quota_key, response.headers)
+        logger.debug("{}{:02d}{} - {} {} via HTTP version {}", Fore.CYAN, account.index, Fore.RESET,
+                     response.status_code, _url_path(url), response.http_version)
 
         response.raise_for_status()  # Raise exception for HTTP errors
 
         try:
-            return response.json()  # Parse JSON response
+            return orjson.loads(response.content)  # Parse JSON response
 
-        except json.JSONDecodeError:
-            logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Failed to decode JSON response: "
-                         f"{getattr(response, 'text', 'No response')}{Fore.RESET}")
+        except orjson.JSONDecodeError:
+            logger.error("{}{:02d}{} - {}Failed to decode JSON response: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED,
+                         getattr(response, 'text', 'No response'), Fore.RESET)
             raise ValueError("Invalid JSON in response")
 
-    except requests.exceptions.ProxyError:
-        logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Proxy connection failed. Unable to connect to proxy{Fore.RESET}")
-        raise
+    except CurlError as e:
+        if _is_proxy_error(e):
+            logger.error("{}{:02d}{} - {}Proxy connection failed. Unable to connect to proxy{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, Fore.RESET)
+            raise
 
-    except requests.exceptions.RequestException as e:
         error_message = str(e)
-        #logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Request error: {urlparse(url).path}{Fore.RESET}")
+        short_error = error_message.split(". See")[0]
+        #logger.error("{}{:02d}{} - {}Request error: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, _url_path(url), Fore.RESET)
 
         # Handle specific HTTP errors
-        if response:
+        if response is not None:
             if response.status_code == 403:
-                logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}403 Forbidden: Check permissions or proxy{Fore.RESET}")
-                time.sleep(random.uniform(5, 10))
+                logger.error("{}{:02d}{} - {}403 Forbidden: Check permissions or proxy{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, Fore.RESET)
+                await asyncio.sleep(random.uniform(5, 10))
             elif response.status_code == 429:
-                retry_after = response.headers.get("Retry-After", "5")
-                logger.warning(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.YELLOW}Rate limited (429). Retrying after {retry_after} seconds{Fore.RESET}")
-                time.sleep(int(retry_after))
-        elif "timed out" in error_message:
-            logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Connection timed out after {timeout} seconds{Fore.RESET}")
+                retry_after = 5 if retry_after is None else retry_after
+                logger.warning("{}{:02d}{} - {}Rate limited (429). Retrying after {:.0f} seconds{}", Fore.CYAN, account.index, Fore.RESET, Fore.YELLOW, retry_after, Fore.RESET)
+                await asyncio.sleep(retry_after)
+            else:
+                logger.error("{}{:02d}{} - {}Request failed: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, short_error, Fore.RESET)
+        elif _is_timeout(e):
+            logger.error("{}{:02d}{} - {}Connection timed out after {} seconds{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, timeout, Fore.RESET)
 
         else:
-            short_error = error_message.split(". See")[0]
-            logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Request failed: {short_error}{Fore.RESET}")
+            logger.error("{}{:02d}{} - {}Request failed: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, short_error, Fore.RESET)
 
     return None
 
@@ -155,6 +426,12 @@ async def retry_request(url, data, account, method="POST", max_retries=3):
     """
     Retry requests using exponential backoff.
     """
+    try:
+        _validate(url, data, method)
+    except ValueError as e:
+        logger.error("{}{:02d}{} - {}Invalid request: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, e, Fore.RESET)
+        return None
+
     for retry_count in range(max_retries):
         try:
             response = await send_request(url, data, account, method)
@@ -163,17 +440,25 @@ async def retry_request(url, data, account, method="POST", max_retries=3):
         except Exception:
             pass # Ignore errors and proceed with retry
 
-        delay = await exponential_backoff(retry_count)
+        delay = exponential_backoff(retry_count)
         await asyncio.sleep(delay)
-        logger.info(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - Retry {retry_count + 1}/{max_retries}: Waiting {delay:.2f} seconds...")
+        logger.info("{}{:02d}{} - Retry {}/{}: Waiting {:.2f} seconds...", Fore.CYAN, account.index, Fore.RESET, retry_count + 1, max_retries, delay)
 
-    logger.error(f"{Fore.CYAN}{account.index:02d}{Fore.RESET} - {Fore.RED}Max retries reached for URL: {urlparse(url).path}{Fore.RESET}")
+    logger.error("{}{:02d}{} - {}Max retries reached for URL: {}{}", Fore.CYAN, account.index, Fore.RESET, Fore.RED, _url_path(url), Fore.RESET)
     return None
 
+# Send many requests concurrently, each with retry logic
+async def retry_request_many(items, method="POST"):
+    """
+    Run retry_request for many (url, data, account) items concurrently, keeping input order.
+    """
+    tasks = [asyncio.create_task(retry_request(url, data, account, method)) for url, data, account in items]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
 # Function to implement exponential backoff delay during retries
-async def exponential_backoff(retry_count, base_delay=1):
+def exponential_backoff(retry_count, base_delay=1):
     """
-    Perform exponential backoff for retries.
+    Perform exponential backoff for retries with full jitter, so accounts retrying together spread out.
     """
-    delay = min(base_delay * (2 ** retry_count) + random.uniform(0, 1), 30)
+    delay = random.uniform(0, min(base_delay * (2 ** retry_count), 30))
     return delay
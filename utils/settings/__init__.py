@@ -1,4 +1,4 @@
 from .logger_setup import logger, Fore, init, setup_logging, startup_art
 from .config import DOMAIN_API, CONNECTION_STATES
 from .config import ACTIVATE_ACCOUNTS, DAILY_CLAIM
-from .config import PING_INTERVAL, PING_DURATION, REQUEST_TIMEOUT, DEBUG
\ No newline at end of file
+from .config import PING_INTERVAL, PING_DURATION, REQUEST_TIMEOUT, MAX_CONCURRENT_REQUESTS, RATE_LIMIT_RPM, DEBUG
\ No newline at end of file
@@ -14,6 +14,8 @@ DAILY_CLAIM = os.getenv('DAILY_CLAIM', 'True') == 'True'
 PING_INTERVAL = int(os.getenv('PING_INTERVAL', 60))
 PING_DURATION = int(os.getenv('PING_DURATION', 1800))
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 25))
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", 0))
 
 # Debugging
 DEBUG = os.getenv('DEBUG', 'False').strip().lower() == 'true'